@@ -136,62 +136,60 @@ class Dumpcap(UpdatableProcess):
         self.poll()
 
         # check every added line in stderr
-        if self.stderr_r and not self.stderr_r.closed:
-            for line in self.stderr_r:
-                if line == '\n':
+        for line in self.stderr_lines():
+            if line == '\n':
+                continue
+            if self.CRE_NETWORK_DISCONNECTED.match(line):
+                self.flags['network_disconnected'] = True
+            if self.state == self.State.STARTED:
+                if "Capturing on '" + self.interface.name + "'\n" == line:
                     continue
-                if self.CRE_NETWORK_DISCONNECTED.match(line):
-                    self.flags['network_disconnected'] = True
-                if self.state == self.State.STARTED:
-                    if "Capturing on '" + self.interface.name + "'\n" == line:
-                        continue
-                    m = self.CRE_CAP_FILE_PATH.match(line)
-                    if m:
-                        detected_cap_file_path = m.group('cap_file_path')
-                        if self.capture_file:
-                            assert detected_cap_file_path == '-'
-                            detected_cap_file_path = self.capture_file  # for the following log
-                        else:
-                            self.tmp_capture_file_path = detected_cap_file_path
-                        logger.debug("Saving capture to '{}'.".format(detected_cap_file_path))
-                        self.state = self.State.AWAITING_PACKETS
-                        continue
-                    assert False, 'Unexpected stderr of dumpcap.' + line + str(self)
-
-                elif self.state == self.State.AWAITING_PACKETS:
-                    m = self.CRE_PACKETS.match(line)
-                    if m:
-                        self.stats['packets'] = int(m.group('packets'))
-                        self.state = self.State.CAPTURING
-                        continue
-                    if self.CRE_SUMMARY1.match(line):
-                        self.state = self.State.STOPPING
-                        continue
-                    assert False, 'Unexpected stderr of dumpcap.' + line + str(self)
-
-                elif self.state == self.State.CAPTURING:
-                    m = self.CRE_PACKETS.match(line)
-                    if m:
-                        self.stats['packets'] = int(m.group('packets'))
-                        continue
-                    if self.CRE_SUMMARY1.match(line):
-                        self.state = self.State.STOPPING
-                        continue
-                    assert False, 'Unexpected stderr of dumpcap.' + line + str(self)
-
-                elif self.state == self.State.STOPPING:
-                    m = self.CRE_SUMMARY2.match(line)
-                    if m:
-                        self.stats['received_end'] = int(m.group('received'))
-                        self.stats['dropped_end'] = int(m.group('dropped'))
-                        continue
-                    assert False, 'Unexpected stderr of dumpcap.' + line + str(self)
+                m = self.CRE_CAP_FILE_PATH.match(line)
+                if m:
+                    detected_cap_file_path = m.group('cap_file_path')
+                    if self.capture_file:
+                        assert detected_cap_file_path == '-'
+                        detected_cap_file_path = self.capture_file  # for the following log
+                    else:
+                        self.tmp_capture_file_path = detected_cap_file_path
+                    logger.debug("Saving capture to '{}'.".format(detected_cap_file_path))
+                    self.state = self.State.AWAITING_PACKETS
+                    continue
+                assert False, 'Unexpected stderr of dumpcap.' + line + str(self)
+
+            elif self.state == self.State.AWAITING_PACKETS:
+                m = self.CRE_PACKETS.match(line)
+                if m:
+                    self.stats['packets'] = int(m.group('packets'))
+                    self.state = self.State.CAPTURING
+                    continue
+                if self.CRE_SUMMARY1.match(line):
+                    self.state = self.State.STOPPING
+                    continue
+                assert False, 'Unexpected stderr of dumpcap.' + line + str(self)
+
+            elif self.state == self.State.CAPTURING:
+                m = self.CRE_PACKETS.match(line)
+                if m:
+                    self.stats['packets'] = int(m.group('packets'))
+                    continue
+                if self.CRE_SUMMARY1.match(line):
+                    self.state = self.State.STOPPING
+                    continue
+                assert False, 'Unexpected stderr of dumpcap.' + line + str(self)
+
+            elif self.state == self.State.STOPPING:
+                m = self.CRE_SUMMARY2.match(line)
+                if m:
+                    self.stats['received_end'] = int(m.group('received'))
+                    self.stats['dropped_end'] = int(m.group('dropped'))
+                    continue
+                assert False, 'Unexpected stderr of dumpcap.' + line + str(self)
 
         # check stdout
-        if self.stdout_r and not self.stdout_r.closed:
-            for line in self.stdout_r:  # type: str
-                # NOTE: stdout should be empty
-                logger.warning("Unexpected stdout of dumpcap: '{}'. {}".format(line, str(self)))
+        for line in self.stdout_lines():  # type: str
+            # NOTE: stdout should be empty
+            logger.warning("Unexpected stdout of dumpcap: '{}'. {}".format(line, str(self)))
 
         # Change state if process was not running in the time of poll() call in the beginning of this method.
         # NOTE: Process' poll() needs to be called in the beginning of this method and returncode checked in the end
@@ -7,14 +7,15 @@ Bachelor's Thesis UIFS FIT VUT
 Martin Vondracek
 2016
 """
-import csv
+import collections
+import concurrent.futures
 import logging
 import os
 import subprocess
 import tempfile
 import time
 from enum import Enum, unique
-from typing import List, Dict
+from typing import List, Dict, Sequence
 
 from wifimitm.updatableProcess import UpdatableProcess
 
@@ -30,48 +31,46 @@ class WifimitmError(Exception):
     pass
 
 
+ApRow = collections.namedtuple(
+    'ApRow',
+    'bssid first_seen last_seen channel speed encryption cipher auth power beacons iv_sum ip_addr id_len essid key')
+"""Column layout of one row of the access points section of csv file generated by airodump-ng during scanning."""
+
+
 def csv_row_station_bssid(row):
     """
     Provide associated bssid of given station.
-    :param row: list of strings representing one row of csv file generated by airodump-ng during scanning
+    :param row: list of stripped strings representing one row of csv file generated by airodump-ng during scanning
     :return: string bssid
     """
-    return row[5].strip()
+    return row[5]
 
 
 def csv_row_to_station(row) -> WirelessStation:
     """
     Convert csv row to station.
-    :param row: list of strings representing one row of csv file generated by airodump-ng during scanning
+    :param row: list of stripped strings representing one row of csv file generated by airodump-ng during scanning
 
     :rtype: WirelessStation
     :return: WirelessStation object
     """
-    mac_address = row[0].strip()
-    power = row[3].strip()
+    mac_address = row[0]
+    power = row[3]
     return WirelessStation(mac_address, power)
 
 
 def csv_row_to_ap(row) -> WirelessAccessPoint:
     """
     Convert csv row to AP.
-    :param row: list of strings representing one row of csv file generated by airodump-ng during scanning
+    :param row: list of stripped strings representing one row of csv file generated by airodump-ng during scanning
 
     :rtype: WirelessAccessPoint
     :return: WirelessAccessPoint object
     """
-    bssid = row[0].strip()
-    power = row[8].strip()
-    channel = row[3].strip()
-    encryption = row[5].strip()
-    cipher = row[6].strip()
-    authentication = row[7].strip()
-    wps = row[6].strip()
-    #
-    essid = row[13].strip()
-    iv_sum = row[10].strip()
-
-    ap = WirelessAccessPoint(bssid, power, channel, encryption, cipher, authentication, wps, essid, iv_sum)
+    r = ApRow._make(row)
+    # NOTE: Airodump-ng CSV output has no WPS column; the previous positional indexing mistakenly reused
+    # the cipher field (row[6]) for it, so wps is not available from a scan.
+    ap = WirelessAccessPoint(r.bssid, r.power, r.channel, r.encryption, r.cipher, r.auth, None, r.essid, r.iv_sum)
     ap.update_known()
 
     return ap
@@ -86,21 +85,32 @@ def csv_to_result(csv_path) -> List[WirelessAccessPoint]:
     :return: List containing WirelessAccessPoint objects with associated WirelessClient objects.
     """
     scan_result = list()
-    with open(csv_path, newline='') as csv_file:
-        reader = csv.reader(csv_file, delimiter=',')
-        for row in reader:
-            if len(row) < 2 or row[1] == ' First time seen':  # skip section headers and empty lines
-                continue
-            elif len(row) == 15:  # reading access points section
-                ap = csv_row_to_ap(row)
-                scan_result.append(ap)
-            elif len(row) == 7:  # reading stations section
-                station = csv_row_to_station(row)
-                associated_bssid = csv_row_station_bssid(row)
-                # add station to associated access point, stations section is read after access points section
-                for ap in scan_result:
-                    if ap.bssid == associated_bssid:
-                        ap.add_associated_station(station)
+    bssid_index = dict()  # maps bssid to its AP for O(1) station association
+    # NOTE: Airodump-ng CSV contains no quoting and no embedded commas, so a plain str.split replaces
+    # the csv.reader state machine. The file is read in a single call and split at C speed. A vectorized
+    # pandas.read_csv would not pay off here: scans hold at most a few hundred rows, every row still has to
+    # be turned into a WirelessAccessPoint or WirelessStation object, and pandas is not a dependency of
+    # this project.
+    # a 1 MiB buffer lets even a long-running capture's CSV come in with a few read syscalls instead of
+    # the default 8 KiB chunks
+    with open(csv_path, buffering=1 << 20) as csv_file:
+        text = csv_file.read()
+    for line in text.split('\n'):
+        # strip all fields in one comprehension instead of a .strip() call per consumed field in the row helpers
+        row = [field.strip() for field in line.split(',')]
+        if len(row) < 2 or row[1] == 'First time seen':  # skip section headers and empty lines
+            continue
+        elif len(row) == 15:  # reading access points section
+            ap = csv_row_to_ap(row)
+            scan_result.append(ap)
+            bssid_index[ap.bssid] = ap
+        elif len(row) == 7:  # reading stations section
+            station = csv_row_to_station(row)
+            associated_bssid = csv_row_station_bssid(row)
+            # add station to associated access point, stations section is read after access points section
+            ap = bssid_index.get(associated_bssid)
+            if ap:
+                ap.add_associated_station(station)
     return scan_result
 
 
@@ -136,6 +146,10 @@ class WirelessScanner(UpdatableProcess):
 
         self.scanning_csv_path = os.path.join(self.tmp_dir.name, 'scan-01.csv')
 
+        # cache of the last parsed scan CSV, see `self.get_scan_result`
+        self.__csv_cache_key = None
+        self.__csv_cache_result = None
+
     def __str__(self):
         return '<{!s} state={!s}>'.format(
             type(self).__name__, self.state)
@@ -173,19 +187,116 @@ class WirelessScanner(UpdatableProcess):
 
     def get_scan_result(self) -> List[WirelessAccessPoint]:
         """
+        The scan CSV is reparsed only if it changed since the previous call. Airodump-ng rewrites the whole file
+        once per write interval, so polls between rewrites are served from the cache for the cost of a single
+        stat syscall.
         :return: List containing WirelessAccessPoint objects with associated WirelessStation objects.
         :rtype List[WirelessAccessPoint]
         """
+        # short initial delay picks the file up soon after airodump-ng creates it, doubling avoids busy polling
+        delay = 0.05
         while not self.has_csv():
             logger.debug('WirelessScanner polling result')
-            time.sleep(1)
-        return csv_to_result(self.scanning_csv_path)
+            time.sleep(delay)
+            delay = min(delay * 2, 1)
+        st = os.stat(self.scanning_csv_path)
+        key = (st.st_mtime_ns, st.st_size)
+        if key != self.__csv_cache_key:
+            self.__csv_cache_result = csv_to_result(self.scanning_csv_path)
+            self.__csv_cache_key = key
+        return self.__csv_cache_result
+
+    def scan_until(self, predicate, timeout, interval=2) -> List[WirelessAccessPoint]:
+        """
+        Scan until `predicate` accepts the scan result, or until `timeout` expires.
+        The scan result is checked once per `interval`, so a network showing up in the first write of the scan
+        CSV is reported seconds before a fixed-length scan would finish.
+        :param predicate: callable accepting the scan result, returns True to end the scan early
+        :param timeout: maximum scan duration in seconds
+        :param interval: delay in seconds between checks, should match process' write_interval
+        :rtype: List[WirelessAccessPoint]
+        :return: scan result as returned by `self.get_scan_result`
+        """
+        deadline = time.monotonic() + timeout
+        last_result = None
+        while True:
+            time.sleep(interval)
+            result = self.get_scan_result()
+            # An unchanged scan CSV is served from the parse cache as the identical list object; re-running
+            # the predicate on it cannot change the previous answer, so only fresh results are checked.
+            if result is not last_result:
+                if predicate(result):
+                    return result
+                last_result = result
+            if time.monotonic() > deadline:
+                return result
 
     def has_csv(self):
         return os.path.isfile(self.scanning_csv_path)
 
 
+def scan_networks(interfaces: Sequence[WirelessInterface], scan_time=6, write_interval=5)\
+        -> List[WirelessAccessPoint]:
+    """
+    Scan wireless networks on all `interfaces` at once and merge the results.
+    One WirelessScanner process runs per interface for the whole `scan_time`, so several interfaces cover
+    the channel space concurrently instead of one interface hopping through it alone. The grown CSVs are
+    parsed in a thread pool - threads are sufficient, the work waits on file reads. Access points reported
+    by several interfaces are merged by bssid and their associated stations are unioned.
+    :type interfaces: Sequence[WirelessInterface]
+    :param interfaces: wireless interfaces for scanning, at least one
+
+    :param scan_time: scan duration in seconds
+    :param write_interval: delay in seconds between writes of the scan CSVs
+
+    :rtype: List[WirelessAccessPoint]
+    :return: merged list containing WirelessAccessPoint objects with associated WirelessStation objects
+    """
+    if not interfaces:
+        raise ValueError('At least one interface for scanning is required.')
+
+    scanners = [WirelessScanner(interface=interface, write_interval=write_interval) for interface in interfaces]
+    try:
+        time.sleep(scan_time)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(scanners)) as executor:
+            results = list(executor.map(WirelessScanner.get_scan_result, scanners))
+    finally:
+        for scanner in scanners:
+            scanner.cleanup()
+
+    return _merge_scan_results(results)
+
+
+def _merge_scan_results(results: Sequence[List[WirelessAccessPoint]]) -> List[WirelessAccessPoint]:
+    """
+    Merge several scan results into one, see `scan_networks`.
+    Access points present in several results are merged by bssid, the first seen object is kept and
+    the associated stations of its duplicates are unioned into it by mac_address.
+    :type results: Sequence[List[WirelessAccessPoint]]
+    :param results: scan results to be merged
+
+    :rtype: List[WirelessAccessPoint]
+    :return: merged list containing WirelessAccessPoint objects with associated WirelessStation objects
+    """
+    merged = collections.OrderedDict()
+    for result in results:
+        for ap in result:
+            known = merged.get(ap.bssid)
+            if known is None:
+                merged[ap.bssid] = ap
+            else:
+                # union stations of an AP seen from several interfaces
+                seen = {station.mac_address for station in known.associated_stations}
+                for station in ap.associated_stations:
+                    if station.mac_address not in seen:
+                        known.add_associated_station(station)
+    return list(merged.values())
+
+
 class WirelessCapturer(UpdatableProcess):
+    __SNAPSHOT_TTL = 0.05
+    """Lifetime of a working directory snapshot in seconds, see `self.__tmp_dir_snapshot`."""
+
     @unique
     class State(Enum):
         """
@@ -204,8 +315,16 @@ class WirelessCapturer(UpdatableProcess):
 
         self.interface = interface  # type: WirelessInterface
         self.ap = ap
+        self.__bssid_bytes = ap.bssid.encode()  # pre-encoded for matching against raw stderr lines
 
         self.wpa_handshake_cap_path = None
+        # background wpaclean extracting the WPA handshake, see `self.__extract_wpa_handshake`
+        self.__wpaclean = None
+        self.__wpaclean_hs_path = None
+
+        # cache of the last parsed capture CSV, see `self.get_capture_result`
+        self.__csv_cache_key = None
+        self.__csv_cache_result = None
 
         cmd = ['airodump-ng',
                '--bssid', ap.bssid,
@@ -216,13 +335,18 @@ class WirelessCapturer(UpdatableProcess):
                '--update', '5',  # delay between display updates
                '-a',
                self.interface.name]
-        super().__init__(cmd)  # start process
+        # NOTE: Airodump-ng writes its Text User Interface to stderr, stdout stays empty - don't capture it.
+        super().__init__(cmd, stdout=False)  # start process
 
         self.capturing_csv_path = os.path.join(self.tmp_dir.name, 'capture-01.csv')
         self.capturing_cap_path = os.path.join(self.tmp_dir.name, 'capture-01.cap')
         self.capturing_xor_path = os.path.join(self.tmp_dir.name, 'capture-01-' +
                                                self.ap.bssid.replace(':', '-') + '.xor')
 
+        # directory snapshot shared by the has_* checks, see `self.__tmp_dir_snapshot`
+        self.__snapshot = None
+        self.__snapshot_time = 0
+
     def __str__(self):
         return '<{!s} state={!s}, flags={!s}>'.format(
             type(self).__name__, self.state, self.flags)
@@ -247,27 +371,32 @@ class WirelessCapturer(UpdatableProcess):
         # Is process running? State would be changed after reading stdout and stderr.
         self.poll()
 
-        # check every added line in stdout
-        if self.stdout_r and not self.stdout_r.closed:
-            for line in self.stdout_r:  # type: str
-                if line == '\n':
-                    continue
-                # NOTE: stdout should be empty
-                logger.warning("Unexpected stdout of airodump-ng: '{}'. {}".format(line, str(self)))
-
-        # check every added line in stderr
-        if self.stderr_r and not self.stderr_r.closed:
-            for line in self.stderr_r:
+        # Check every added line in stderr, raw lines are scanned without decoding. The pipe is drained even
+        # after the handshake was detected, so the process cannot block on a full pipe buffer, but the lines
+        # are not scanned anymore - there is nothing left to look for.
+        lines = self.stderr_lines_raw()
+        if not self.flags['detected_wpa_handshake']:
+            for line in lines:
                 if self.state == self.State.STARTED:
-                    if self.ap.bssid in line:
+                    if self.__bssid_bytes in line:
                         self.state = self.State.CAPTURING
 
                 if self.state == self.State.CAPTURING:
-                    if 'WPA handshake:' in line and not self.flags['detected_wpa_handshake']:
+                    if b'WPA handshake:' in line:
                         # only on the first print of 'WPA handshake:'
                         self.flags['detected_wpa_handshake'] = True
                         logger.debug('WirelessCapturer detected WPA handshake.')
                         self.__extract_wpa_handshake()
+                        break
+
+        # Complete a previously started background wpaclean, see `self.__extract_wpa_handshake`.
+        if self.__wpaclean is not None and self.__wpaclean.poll() is not None:
+            wpaclean = self.__wpaclean
+            self.__wpaclean = None
+            if wpaclean.returncode != 0:
+                raise subprocess.CalledProcessError(returncode=wpaclean.returncode, cmd=wpaclean.args)
+            self.wpa_handshake_cap_path = self.__wpaclean_hs_path
+            logger.debug('WirelessCapturer extracted WPA handshake.')
 
         # Change state if process was not running in the time of poll() call in the beginning of this method.
         # NOTE: Process' poll() needs to be called in the beginning of this method and returncode checked in the end
@@ -285,24 +414,54 @@ class WirelessCapturer(UpdatableProcess):
         Temp files are closed and deleted,
         :param stop: Stop process if it's running.
         """
+        if self.__wpaclean is not None and self.__wpaclean.poll() is None:
+            # handshake extraction still running, its output is deleted with tmp_dir anyway
+            self.__wpaclean.kill()
+            self.__wpaclean.wait()
+            self.__wpaclean = None
         super().cleanup(stop=stop)
         self.wpa_handshake_cap_path = None  # file was deleted with tmp_dir
 
     def get_capture_result(self) -> List[WirelessAccessPoint]:
         """
+        The capture CSV is reparsed only if it changed since the previous call. Airodump-ng rewrites it once per
+        write interval, so most polls observe an unchanged file and are served from the cache for the cost of
+        a single stat syscall.
         :return: List containing WirelessAccessPoint objects with associated WirelessStation objects.
         :rtype List[WirelessAccessPoint]
         """
+        # short initial delay picks the file up soon after airodump-ng creates it, doubling avoids busy polling
+        delay = 0.05
         while not self.has_capture_csv():
             logger.debug('WirelessCapturer polling result')
-            time.sleep(1)
-        return csv_to_result(self.capturing_csv_path)
+            time.sleep(delay)
+            delay = min(delay * 2, 1)
+        st = os.stat(self.capturing_csv_path)
+        key = (st.st_mtime_ns, st.st_size)
+        if key != self.__csv_cache_key:
+            self.__csv_cache_result = csv_to_result(self.capturing_csv_path)
+            self.__csv_cache_key = key
+        return self.__csv_cache_result
+
+    def __tmp_dir_snapshot(self):
+        """
+        Return a set of filenames currently present in process' working directory.
+        A single scandir serves all `has_*` checks of a polling tick instead of one stat syscall each.
+        The snapshot is reused for at most `__SNAPSHOT_TTL` seconds, which is shorter than the shortest delay
+        of the polling loops, so a freshly created file is never missed for longer than one poll.
+        :rtype: set
+        """
+        now = time.monotonic()
+        if self.__snapshot is None or now - self.__snapshot_time > self.__SNAPSHOT_TTL:
+            self.__snapshot = {entry.name for entry in os.scandir(self.tmp_dir.name)}
+            self.__snapshot_time = now
+        return self.__snapshot
 
     def has_capture_csv(self):
-        return os.path.isfile(self.capturing_csv_path)
+        return os.path.basename(self.capturing_csv_path) in self.__tmp_dir_snapshot()
 
     def has_prga_xor(self):
-        return os.path.isfile(self.capturing_xor_path)
+        return os.path.basename(self.capturing_xor_path) in self.__tmp_dir_snapshot()
 
     def get_iv_sum(self) -> str:
         """
@@ -317,15 +476,17 @@ class WirelessCapturer(UpdatableProcess):
 
     def __extract_wpa_handshake(self):
         """
-        Raises:
-            CalledProcessError: If returncode of wpaclean is non-zero.
+        Start extraction of the WPA handshake from the capture file.
+        Wpaclean runs in the background so the update loop is not blocked for its duration;
+        `self.wpa_handshake_cap_path` is set by `self.update` once wpaclean finishes successfully.
+        `self.update` raises CalledProcessError if returncode of wpaclean is non-zero.
         """
         if not os.path.isfile(self.capturing_cap_path):
             raise FileNotFoundError
         hs_path = os.path.join(self.tmp_dir.name, 'WPA_handshake.cap')
         cmd = ['wpaclean', hs_path, self.capturing_cap_path]
-        subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
-        self.wpa_handshake_cap_path = hs_path
+        self.__wpaclean = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.__wpaclean_hs_path = hs_path
 
 
 def deauthenticate(interface: WirelessInterface, station, count=10):
@@ -358,3 +519,38 @@ def deauthenticate(interface: WirelessInterface, station, count=10):
 
     subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
     logger.debug('deauth sent to ' + station.mac_address)
+
+
+def deauthenticate_many(interface: WirelessInterface, stations, count=10):
+    """
+    Deauthenticate several stations with as few aireplay-ng invocations as possible.
+    When all `stations` are associated with the same AP - the usual case in the attack loops - one broadcast
+    deauthentication series reaches all of them with a single subprocess spawn instead of one per station.
+    Stations of different APs fall back to one targeted `deauthenticate` call each.
+    :type interface: WirelessInterface
+    :param interface: wireless interface for deauthentication
+
+    :param stations: associated stations to be deauthenticated
+    :param count: amount of deauth series to be sent per invocation, each series consists of 64 deauth packets
+    """
+    if count <= 0:
+        raise ValueError
+
+    stations = list(stations)
+    if not stations:
+        return
+
+    bssids = {station.associated_ap.bssid for station in stations}
+    if len(bssids) == 1:
+        bssid = bssids.pop()
+        # NOTE: Without '-c', aireplay-ng sends the deauthentication series to the broadcast address,
+        # covering every station of the AP at once.
+        cmd = ['aireplay-ng',
+               '--deauth', str(count),
+               '-a', bssid,  # MAC address of access point.
+               interface.name]
+        subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+        logger.debug('broadcast deauth sent to ' + bssid)
+    else:
+        for station in stations:
+            deauthenticate(interface, station, count=count)
@@ -182,97 +182,95 @@ class Wifiphisher(UpdatableProcess):
         self.poll()
 
         # check every added line in stdout
-        if self.stdout_r and not self.stdout_r.closed:
-            for line in self.stdout_r:  # type: str
-                # logger.debug("line 1'{}'".format(line.replace('\n', '\\n')))
-                line = self.CRE_ANSI_ESCAPE.sub('', line)
-                # logger.debug("line 2'{}'".format(line.replace('\n', '\\n')))
-                if line == '\n':
+        for line in self.stdout_lines():  # type: str
+            # logger.debug("line 1'{}'".format(line.replace('\n', '\\n')))
+            line = self.CRE_ANSI_ESCAPE.sub('', line)
+            # logger.debug("line 2'{}'".format(line.replace('\n', '\\n')))
+            if line == '\n':
+                continue
+            if self.state == self.State.STARTED:
+                # skip banner
+                if line.startswith('     '):
                     continue
-                if self.state == self.State.STARTED:
-                    # skip banner
-                    if line.startswith('     '):
-                        continue
-
-                    # print startup info
-                    if line.startswith(('[+] ', '[*] ', '[!] ')):
-                        print('wifiphisher 1> ' + line[4:], end='')
-
-                    # check for finished startup
-                    if line == '[*] Monitor mode: {} - {}\n' \
-                            .format(self.jamming_interface.name, self.jamming_interface.mac_address):
-                        self.state = self.State.PHISHING
-                        continue
-
-                elif self.state == self.State.PHISHING:
-                    # check for section header or closing notification
-                    if line == 'Jamming devices: \n':
-                        self.output_section = self.OutputSection.JAMMING_DEVICES
-                        continue
-                    elif line == 'DHCP Leases: \n':
-                        self.output_section = self.OutputSection.DHCP_LEASES
-                        continue
-                    elif line == 'HTTP requests: \n':
-                        self.output_section = self.OutputSection.HTTP_REQUESTS
-                        continue
-                    elif line == '[!] Closing\n':
-                        self.output_section = None
-                        self.state = self.State.STOPPING
-                        logger.debug('wifiphisher announced closing')
-                        continue
-
-                    # read section content
-                    if self.output_section == self.OutputSection.JAMMING_DEVICES:
-                        if line not in self.stats.jamming_devices:
-                            self.stats.jamming_devices.append(line)
-                            logger.info('device: ' + line)
-                            print('wifiphisher 1> device: ' + line, end='')
-                        continue
-
-                    elif self.output_section == self.OutputSection.DHCP_LEASES:
-                        # parse line from DHCP Leases section
-                        lease = Wifiphisher.DHCPLease.parse_from_line(line)
-                        # add new leases to the stats
-                        if lease.client_id not in self.stats.dhcp_leases:
-                            logger.info('lease: ' + str(lease))
-                            print('wifiphisher 1> lease: ' + line, end='')
-                        self.stats.dhcp_leases[lease.client_id] = lease  # add new or update existing
-                        continue
-
-                    elif self.output_section == self.OutputSection.HTTP_REQUESTS:
-                        if line not in self.stats.http_requests:
-                            self.stats.http_requests.append(line)
-                            logger.info('request: ' + line)
-                            print('wifiphisher 1> request: ' + line, end='')
-
-                        if 'wfphshr-wpa-password=' in line:
-                            self.password = line[line.find('wfphshr-wpa-password=') + 21:].rstrip('\n')
-                            self.flags['password_caught'] = True
-                            logger.info("Wifiphisher caught password '{}'!".format(self.password))
-                            print("Wifiphisher caught password '{}'!".format(self.password))
-                        continue
-
-                    logger.warning("Unexpected stdout '{}' from {}"
-                                   .format(line.replace('\n', '\\n'), type(self).__name__))
-
-                elif self.state == self.State.STOPPING:
-                    print('wifiphisher 1> ' + line, end='')
 
-        # check stderr
-        if self.stderr_r and not self.stderr_r.closed:
-            for line in self.stderr_r:  # type: str
-                line = self.CRE_ANSI_ESCAPE.sub('', line)
-                if line == "'emacs': unknown terminal type.\n":
-                    logger.debug("ignored line '{}' from {}".format(line.replace('\n', '\\n'), type(self).__name__))
+                # print startup info
+                if line.startswith(('[+] ', '[*] ', '[!] ')):
+                    print('wifiphisher 1> ' + line[4:], end='')
+
+                # check for finished startup
+                if line == '[*] Monitor mode: {} - {}\n' \
+                        .format(self.jamming_interface.name, self.jamming_interface.mac_address):
+                    self.state = self.State.PHISHING
+                    continue
+
+            elif self.state == self.State.PHISHING:
+                # check for section header or closing notification
+                if line == 'Jamming devices: \n':
+                    self.output_section = self.OutputSection.JAMMING_DEVICES
+                    continue
+                elif line == 'DHCP Leases: \n':
+                    self.output_section = self.OutputSection.DHCP_LEASES
+                    continue
+                elif line == 'HTTP requests: \n':
+                    self.output_section = self.OutputSection.HTTP_REQUESTS
+                    continue
+                elif line == '[!] Closing\n':
+                    self.output_section = None
+                    self.state = self.State.STOPPING
+                    logger.debug('wifiphisher announced closing')
+                    continue
+
+                # read section content
+                if self.output_section == self.OutputSection.JAMMING_DEVICES:
+                    if line not in self.stats.jamming_devices:
+                        self.stats.jamming_devices.append(line)
+                        logger.info('device: ' + line)
+                        print('wifiphisher 1> device: ' + line, end='')
+                    continue
+
+                elif self.output_section == self.OutputSection.DHCP_LEASES:
+                    # parse line from DHCP Leases section
+                    lease = Wifiphisher.DHCPLease.parse_from_line(line)
+                    # add new leases to the stats
+                    if lease.client_id not in self.stats.dhcp_leases:
+                        logger.info('lease: ' + str(lease))
+                        print('wifiphisher 1> lease: ' + line, end='')
+                    self.stats.dhcp_leases[lease.client_id] = lease  # add new or update existing
+                    continue
+
+                elif self.output_section == self.OutputSection.HTTP_REQUESTS:
+                    if line not in self.stats.http_requests:
+                        self.stats.http_requests.append(line)
+                        logger.info('request: ' + line)
+                        print('wifiphisher 1> request: ' + line, end='')
+
+                    if 'wfphshr-wpa-password=' in line:
+                        self.password = line[line.find('wfphshr-wpa-password=') + 21:].rstrip('\n')
+                        self.flags['password_caught'] = True
+                        logger.info("Wifiphisher caught password '{}'!".format(self.password))
+                        print("Wifiphisher caught password '{}'!".format(self.password))
                     continue
 
-                if self.state == self.State.STOPPING:
-                    if line.startswith('Exception'):
-                        logger.debug('ignored exception inside {}'.format(str(self)))
-                    logger.debug(line.replace('\n', '\\n'))
-                else:
-                    logger.warning("Unexpected stderr '{}' from {}"
-                                   .format(line.replace('\n', '\\n'), type(self).__name__))
+                logger.warning("Unexpected stdout '{}' from {}"
+                               .format(line.replace('\n', '\\n'), type(self).__name__))
+
+            elif self.state == self.State.STOPPING:
+                print('wifiphisher 1> ' + line, end='')
+
+        # check stderr
+        for line in self.stderr_lines():  # type: str
+            line = self.CRE_ANSI_ESCAPE.sub('', line)
+            if line == "'emacs': unknown terminal type.\n":
+                logger.debug("ignored line '{}' from {}".format(line.replace('\n', '\\n'), type(self).__name__))
+                continue
+
+            if self.state == self.State.STOPPING:
+                if line.startswith('Exception'):
+                    logger.debug('ignored exception inside {}'.format(str(self)))
+                logger.debug(line.replace('\n', '\\n'))
+            else:
+                logger.warning("Unexpected stderr '{}' from {}"
+                               .format(line.replace('\n', '\\n'), type(self).__name__))
 
         # Change state if process was not running in the time of poll() call in the beginning of this method.
         # NOTE: Process' poll() needs to be called in the beginning of this method and returncode checked in the end
@@ -124,6 +124,10 @@ class WirelessAccessPoint(object):
             with open(self.psk_path, 'r') as f:
                 return f.read()
 
+    # NOTE: The save_* methods below hand captured files over from a process' temporary working directory to
+    # the network's persistent directory. shutil.move renames within one filesystem; across filesystems
+    # (typically tmpfs /tmp -> home) it falls back to a copy, which since Python 3.8 is performed in kernel
+    # space via os.sendfile. No user-space buffer loop is involved, so an explicit sendfile call is not needed.
     def save_arp_cap(self, source_arp_cap_path):
         """
         Save capture with ARP Requests for successful ARP Replay.
@@ -312,12 +316,8 @@ class WirelessInterface(object):
         """
         Get current default gateway.
         """
-        gateway = None
         gws = netifaces.gateways()
-        for gw in gws[netifaces.AF_INET]:
-            if gw[1] == self.name:
-                gateway = gw[0]
-                break
+        gateway = next((gw[0] for gw in gws[netifaces.AF_INET] if gw[1] == self.name), None)
         assert gateway, 'No default gateway available.'
         return gateway
 
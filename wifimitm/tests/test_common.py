@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Unit tests for common module
+
+Automation of MitM Attack on WiFi Networks
+Bachelor's Thesis UIFS FIT VUT
+Martin Vondracek
+2016
+"""
+import os as _os
+import unittest as _unittest
+
+from wifimitm.common import _merge_scan_results, csv_to_result
+from wifimitm.model import WirelessAccessPoint, WirelessStation
+
+__author__ = 'Martin Vondracek'
+__email__ = 'xvondr20@stud.fit.vutbr.cz'
+
+
+def _make_ap(bssid, essid) -> WirelessAccessPoint:
+    return WirelessAccessPoint(bssid=bssid, power='-45', channel='1', encryption='WPA2', cipher='CCMP',
+                               authentication='PSK', wps=None, essid=essid, iv_sum='0')
+
+
+def _make_station(mac_address) -> WirelessStation:
+    return WirelessStation(mac_address=mac_address, power='-38')
+
+
+class TestCsvToResult(_unittest.TestCase):
+    """
+    Unit tests for parsing of the csv file generated by airodump-ng during scanning.
+    The sample file contains the access points section, the stations section, a station which is not associated
+    with any access point, section headers and blank lines.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.csv_path = _os.path.join(_os.path.dirname(__file__), 'scan-01.csv')
+
+    def setUp(self):
+        self.result = csv_to_result(self.csv_path)
+
+    def test_access_points(self):
+        self.assertEqual([ap.bssid for ap in self.result], ['50:9F:27:BA:E5:01', 'C4:E9:84:12:34:56'])
+
+    def test_access_point_fields(self):
+        ap = self.result[0]
+        self.assertEqual(ap.essid, 'network1')
+        self.assertEqual(ap.channel, '1')
+        self.assertEqual(ap.encryption, 'WPA2')
+        self.assertEqual(ap.cipher, 'CCMP')
+        self.assertEqual(ap.authentication, 'PSK')
+        self.assertEqual(ap.power, '-45')
+        self.assertEqual(ap.iv_sum, '5')
+        # NOTE: Airodump-ng CSV output has no WPS column, so wps is not available from a scan.
+        self.assertIsNone(ap.wps)
+
+    def test_access_point_fields_are_stripped(self):
+        # the WEP row carries the padding spaces of the csv columns
+        ap = self.result[1]
+        self.assertEqual(ap.essid, 'network2')
+        self.assertEqual(ap.encryption, 'WEP')
+        self.assertEqual(ap.cipher, 'WEP')
+        self.assertEqual(ap.authentication, 'SKA')
+        self.assertEqual(ap.iv_sum, '1204')
+
+    def test_station_association(self):
+        ap = self.result[0]
+        self.assertEqual(len(ap.associated_stations), 1)
+        station = ap.associated_stations[0]
+        self.assertEqual(station.mac_address, '64:A2:F9:11:22:33')
+        self.assertEqual(station.power, '-38')
+        self.assertIs(station.associated_ap, ap)
+
+    def test_not_associated_station_is_skipped(self):
+        self.assertEqual(self.result[1].associated_stations, [],
+                         "A '(not associated)' station must not be associated with any access point.")
+
+
+class TestMergeScanResults(_unittest.TestCase):
+    def test_empty(self):
+        self.assertEqual(_merge_scan_results([]), [])
+        self.assertEqual(_merge_scan_results([[], []]), [])
+
+    def test_distinct_aps_are_concatenated(self):
+        ap1 = _make_ap('50:9F:27:BA:E5:01', 'network1')
+        ap2 = _make_ap('50:9F:27:BA:E5:02', 'network2')
+        self.assertEqual(_merge_scan_results([[ap1], [ap2]]), [ap1, ap2])
+
+    def test_duplicate_ap_keeps_first_seen_object(self):
+        ap_first = _make_ap('50:9F:27:BA:E5:01', 'network1')
+        ap_duplicate = _make_ap('50:9F:27:BA:E5:01', 'network1')
+        merged = _merge_scan_results([[ap_first], [ap_duplicate]])
+        self.assertEqual(len(merged), 1)
+        self.assertIs(merged[0], ap_first)
+
+    def test_duplicate_ap_stations_are_unioned(self):
+        ap_first = _make_ap('50:9F:27:BA:E5:01', 'network1')
+        ap_first.add_associated_station(_make_station('64:A2:F9:11:22:33'))
+
+        ap_duplicate = _make_ap('50:9F:27:BA:E5:01', 'network1')
+        # station seen from both interfaces, must not be associated twice
+        ap_duplicate.add_associated_station(_make_station('64:A2:F9:11:22:33'))
+        new_station = _make_station('64:A2:F9:44:55:66')
+        ap_duplicate.add_associated_station(new_station)
+
+        merged = _merge_scan_results([[ap_first], [ap_duplicate]])
+        self.assertEqual(len(merged), 1)
+        self.assertEqual([station.mac_address for station in merged[0].associated_stations],
+                         ['64:A2:F9:11:22:33', '64:A2:F9:44:55:66'])
+        self.assertIs(new_station.associated_ap, ap_first,
+                      'Station unioned into the kept AP was not reassociated with it.')
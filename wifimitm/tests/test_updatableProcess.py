@@ -7,6 +7,7 @@ Bachelor's Thesis UIFS FIT VUT
 Martin Vondracek
 2016
 """
+import os as _os
 import typing as _typing
 import unittest as _unittest
 
@@ -94,3 +95,71 @@ class TestUpdatableProcess(_unittest.TestCase):
             self.process = self.UpdatableProcessSubclass(self.continuously_running_cmd)
             del self.process
             self.process = None
+
+
+class TestDrain(_unittest.TestCase):
+    """
+    Unit tests for `UpdatableProcess._drain`, the non-blocking pipe reading behind `stdout_lines` and
+    `stderr_lines`. The pipe is created directly, no process needs to be spawned.
+    """
+
+    def setUp(self):
+        r, w = _os.pipe()
+        _os.set_blocking(r, False)
+        self.reader = _os.fdopen(r, mode='rb', buffering=0)
+        self.writer = _os.fdopen(w, mode='wb', buffering=0)
+        self.buffer = bytearray()
+
+    def tearDown(self):
+        if not self.reader.closed:
+            self.reader.close()
+        if not self.writer.closed:
+            self.writer.close()
+
+    def drain(self):
+        return UpdatableProcess._drain(self.reader, self.buffer)
+
+    def test_newline_terminated_lines(self):
+        self.writer.write(b'first\nsecond\nthird')
+        self.assertEqual(self.drain(), [b'first\n', b'second\n'])
+        self.assertEqual(self.buffer, b'third', 'Incomplete line was not kept in the buffer.')
+
+    def test_incomplete_line_completed_by_subsequent_read(self):
+        self.writer.write(b'par')
+        self.assertEqual(self.drain(), [])
+        self.writer.write(b'tial\n')
+        self.assertEqual(self.drain(), [b'partial\n'])
+
+    def test_carriage_return_terminated_lines(self):
+        # dumpcap and aireplay-ng redraw their status lines terminated by a bare '\r'
+        self.writer.write(b'File: x\n\rPackets: 1 \rPackets: 3 ')
+        self.assertEqual(self.drain(), [b'File: x\n', b'\n', b'Packets: 1 \n'])
+        self.assertEqual(self.buffer, b'Packets: 3 ')
+        self.writer.write(b'\rPackets: 5 ')
+        self.assertEqual(self.drain(), [b'Packets: 3 \n'])
+
+    def test_crlf_terminated_lines(self):
+        self.writer.write(b'first\r\nsecond\r\n')
+        self.assertEqual(self.drain(), [b'first\n', b'second\n'])
+
+    def test_trailing_carriage_return_held_across_reads(self):
+        # a trailing '\r' may be the first half of a '\r\n' pair, it must not produce an extra empty line
+        self.writer.write(b'line\r')
+        self.assertEqual(self.drain(), [])
+        self.writer.write(b'\nnext\n')
+        self.assertEqual(self.drain(), [b'line\n', b'next\n'])
+
+    def test_unterminated_line_returned_at_eof(self):
+        # aircrack-ng flushes its whole report only on exit and its last line has no trailing newline
+        self.writer.write(b'Failed. Next try with 5000 IVs\nKEY FOUND! [ 12:34:56:78:90 ]')
+        self.writer.close()
+        self.assertEqual(self.drain(), [b'Failed. Next try with 5000 IVs\n', b'KEY FOUND! [ 12:34:56:78:90 ]'])
+        self.assertEqual(self.buffer, b'', 'Unterminated last line was left in the buffer.')
+
+    def test_reader_closed_at_eof(self):
+        # the read end has to be closed at end of file, so selectors watching the pipe stop reporting it
+        self.writer.write(b'done\n')
+        self.writer.close()
+        self.assertEqual(self.drain(), [b'done\n'])
+        self.assertTrue(self.reader.closed, 'Read end was not closed at end of file.')
+        self.assertEqual(self.drain(), [], 'Drain of a closed reader has to return no lines.')
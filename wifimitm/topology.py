@@ -75,22 +75,20 @@ class ArpSpoofing(UpdatableProcess):
         self.poll()
 
         # check every added line in stdout
-        if self.stdout_r and not self.stdout_r.closed:
-            for line in self.stdout_r:
-                if self.state == self.State.STARTED and line == '|_ SMB server online\n':
-                    self.state = self.State.SPOOFING
+        for line in self.stdout_lines():
+            if self.state == self.State.STARTED and line == '|_ SMB server online\n':
+                self.state = self.State.SPOOFING
 
-                elif self.state == self.State.SPOOFING and line != '\n':
-                    if print_stream:
-                        print(print_prefix + line, end='', file=print_stream)
+            elif self.state == self.State.SPOOFING and line != '\n':
+                if print_stream:
+                    print(print_prefix + line, end='', file=print_stream)
 
         # check every added line in stderr
-        if self.stderr_r and not self.stderr_r.closed:
-            for line in self.stderr_r:
-                if ' * Running on http://127.0.0.1:9999/ (Press CTRL+C to quit)\n' == line:
-                    continue
-                # NOTE: stderr should be now empty
-                logger.warning("Unexpected stderr of 'mitmf': '{}'. {}".format(line, str(self)))
+        for line in self.stderr_lines():
+            if ' * Running on http://127.0.0.1:9999/ (Press CTRL+C to quit)\n' == line:
+                continue
+            # NOTE: stderr should be now empty
+            logger.warning("Unexpected stderr of 'mitmf': '{}'. {}".format(line, str(self)))
 
         # Change state if process was not running in the time of poll() call in the beginning of this method.
         # NOTE: Process' poll() needs to be called in the beginning of this method and returncode checked in the end
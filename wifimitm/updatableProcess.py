@@ -6,6 +6,13 @@ Automation of MitM Attack on WiFi Networks
 Bachelor's Thesis UIFS FIT VUT
 Martin Vondracek
 2016
+
+#Implementation notes
+- Subprocess supervision deliberately stays on subprocess.Popen with non-blocking pipe reads. Attack loops which
+  supervise several processes at once wait on the pipes' read ends with a selector and call `update` on whichever
+  process produced feedback, so concurrency comes without threads or an event loop. An asyncio rewrite
+  (asyncio.create_subprocess_exec + StreamReader) would provide the same wakeups, but would force async signatures
+  on every attacker class and drop the Popen API this class and its tests are built on.
 """
 
 import logging
@@ -15,7 +22,7 @@ import tempfile
 import warnings
 import weakref
 from abc import ABC, abstractmethod
-from typing import Optional, Sequence, IO, Union
+from typing import List, Optional, Sequence, IO, Union
 
 __author__ = 'Martin Vondracek'
 __email__ = 'xvondr20@stud.fit.vutbr.cz'
@@ -28,10 +35,10 @@ class UpdatableProcess(ABC, subprocess.Popen):
     Process capable of updating its state based on process' feedback.
     Feedback is considered stdout, stderr, exitcode in case of process' exit and other files created by running process.
 
-    Temporary directory is created for process' feedback.
+    Temporary directory is created as a working directory for files created by the running process.
 
-    Process' stdout and stderr are continuously written to files in the temporary directory. Stdout and stderr can be
-    independently read using `self.stdout_r` and `self.stderr_r` file-like objects.
+    Process' stdout and stderr are continuously written to pipes. The read ends of the pipes are non-blocking, newly
+    available complete lines can be obtained using `self.stdout_lines()` and `self.stderr_lines()`.
 
     Can be used as context manager, on exit from the context, the process is waited and then cleanup is performed.
 
@@ -39,24 +46,30 @@ class UpdatableProcess(ABC, subprocess.Popen):
     `self.cleanup()` call. Call to `__del__` will stop the process, but `__del__` call is not guaranteed during
     destruction, see `Data model <https://docs.python.org/3.5/reference/datamodel.html>`_.
 
-    On cleanup, finalizer call or `__del__` call, stdout and stderr file-like objects for reading and writing are
-    closed, temporary directory and all its content is deleted.
+    On cleanup, finalizer call or `__del__` call, stdout and stderr pipes are closed, temporary directory and all its
+    content is deleted.
     """
     # default values for destructor in case of unsuccessful initialization
     # Initialization could raise an exception in different places and some of the following attributes could be
     # initialized or not. Destructor needs to know which of them were initialized and therefore which need closing
     # or cleanup.
+    READ_CHUNK_SIZE = 65536
+    """Size of a single `os.read` from the pipes' read ends. A larger buffer than the 8 KiB stdio default means one
+    syscall can drain a whole burst of process' output lines at once."""
+
     tmp_dir = None
     stdout_w = None
     stdout_r = None
     stderr_w = None
     stderr_r = None
+    _owns_tmp_dir = False  # whether cleanup should delete `tmp_dir`, see `self.__init__()`
     _popen_initialized = False  # important for destructor, see `self.__del__()`
     _finalizer_initialized = False  # important for cleanup called from destructor, see `self.__del__()`
 
     def __init__(self, args: Sequence[str],
                  stdin: Optional[IO]=None,
-                 stdout: Union[IO, bool]=True, stderr: Union[IO, bool]=True):
+                 stdout: Union[IO, bool]=True, stderr: Union[IO, bool]=True,
+                 tmp_dir: Optional[tempfile.TemporaryDirectory]=None):
         """
         Execute a child program in a new process.
         :type args: Sequence[str]
@@ -66,21 +79,33 @@ class UpdatableProcess(ABC, subprocess.Popen):
         :param stdin: Write file to process' stdin.
 
         :type stdout: Union[IO, bool]
-        :param stdout: Write stdout to provided file instead of writing it to file in /tmp. If False is provided, stdout
-        is written to /dev/null. If True is provided, temporary file in temporary directory is created.
+        :param stdout: Write stdout to provided file instead of capturing it. If False is provided, stdout
+        is written to /dev/null. If True is provided, stdout is captured through a pipe.
 
         :type stderr: Union[IO, bool]
-        :param stderr: Write stderr to provided file instead of writing it to file in /tmp. If False is provided, stderr
-        is written to /dev/null. If True is provided, temporary file in temporary directory is created.
+        :param stderr: Write stderr to provided file instead of capturing it. If False is provided, stderr
+        is written to /dev/null. If True is provided, stderr is captured through a pipe.
+
+        :type tmp_dir: Optional[tempfile.TemporaryDirectory]
+        :param tmp_dir: Working directory for files created by the running process. If provided, the caller keeps
+        the ownership and is responsible for its cleanup; files created by the process survive this object's cleanup.
+        If None is provided, a dedicated temporary directory is created and deleted on cleanup.
         """
         self.cleaned = False
-        # temp files (write, read) for stdout and stderr
-        self.tmp_dir = tempfile.TemporaryDirectory(prefix=type(self).__name__)
+        # working directory for files created by the running process
+        if tmp_dir is not None:
+            self.tmp_dir = tmp_dir
+            self._owns_tmp_dir = False
+        else:
+            self.tmp_dir = tempfile.TemporaryDirectory(prefix=type(self).__name__)
+            self._owns_tmp_dir = True
+        # buffers for incomplete lines read from the non-blocking pipes
+        self._stdout_buffer = bytearray()
+        self._stderr_buffer = bytearray()
 
         if stdout is True:
-            # capture output to a temporary file
-            self.stdout_w = open(os.path.join(self.tmp_dir.name, 'stdout.txt'), mode='wt', buffering=1)
-            self.stdout_r = open(os.path.join(self.tmp_dir.name, 'stdout.txt'), mode='rt', buffering=1)
+            # capture output through a pipe, read end is non-blocking
+            self.stdout_r, self.stdout_w = self.__pipe()
         elif stdout is False:
             # do NOT capture output
             self.stdout_w = subprocess.DEVNULL
@@ -89,16 +114,18 @@ class UpdatableProcess(ABC, subprocess.Popen):
             self.stdout_w = stdout
 
         if stderr is True:
-            # capture output to a temporary file
-            self.stderr_w = open(os.path.join(self.tmp_dir.name, 'stderr.txt'), mode='wt', buffering=1)
-            self.stderr_r = open(os.path.join(self.tmp_dir.name, 'stderr.txt'), mode='rt', buffering=1)
-        elif stdout is False:
+            # capture output through a pipe, read end is non-blocking
+            self.stderr_r, self.stderr_w = self.__pipe()
+        elif stderr is False:
             # do NOT capture output
             self.stderr_w = subprocess.DEVNULL
         else:
             # write output to provided file
-            self.stderr_w = stdout
+            self.stderr_w = stderr
 
+        # NOTE: No preexec_fn is used, so CPython spawns the child through its vfork()/posix_spawn() fast path
+        # instead of a full copy-on-write fork of the supervisor. Keep it that way - any future preexec_fn would
+        # silently fall back to fork() and pay a page-table copy on every (re)start.
         super().__init__(args=args, cwd=self.tmp_dir.name,
                          stdin=stdin, stdout=self.stdout_w, stderr=self.stderr_w, universal_newlines=True, bufsize=1)
         self._popen_initialized = True
@@ -109,24 +136,128 @@ class UpdatableProcess(ABC, subprocess.Popen):
         if self.stderr_w == subprocess.DEVNULL:
             self.stderr_w = None
 
+        # The child process now owns duplicates of the pipes' write ends, close them in the parent so EOF can be
+        # detected on the read ends after the child exits.
+        if self.stdout_r:
+            self.stdout_w.close()
+        if self.stderr_r:
+            self.stderr_w.close()
+
         self._finalizer = weakref.finalize(
             self, self._cleanup,
-            files=[self.stdout_w, self.stdout_r, self.stderr_w, self.stderr_r], tmp_dir=self.tmp_dir)
+            files=[self.stdout_w, self.stdout_r, self.stderr_w, self.stderr_r],
+            tmp_dir=self.tmp_dir if self._owns_tmp_dir else None)
         self._finalizer_initialized = True
 
-        logger.debug('{!s} started; stdout @ {!s}, stderr @ {!s}'.format(
-            type(self).__name__,
-            self.stdout_w.name if self.stdout_w else None,
-            self.stderr_w.name if self.stderr_w else None)
-        )
+        logger.debug('{!s} started; stdout captured: {!s}, stderr captured: {!s}'.format(
+            type(self).__name__, self.stdout_r is not None, self.stderr_r is not None))
+
+    @staticmethod
+    def __pipe():
+        """
+        Create a pipe for capturing process' output.
+        :return: pair of file objects (read end with non-blocking raw reads, write end)
+        """
+        r, w = os.pipe()
+        os.set_blocking(r, False)
+        return os.fdopen(r, mode='rb', buffering=0), os.fdopen(w, mode='wb', buffering=0)
+
+    @classmethod
+    def _drain(cls, reader: Optional[IO], buffer: bytearray) -> List[bytes]:
+        """
+        Read all currently available bytes from non-blocking `reader` and return newly completed lines.
+        Like in universal newlines mode, '\\n', '\\r' and '\\r\\n' all terminate a line and returned lines always
+        end with b'\\n'. Bytes of a trailing incomplete line are kept in `buffer` until the line is completed
+        by a subsequent read; a line the process left unterminated before closing its output is returned at end
+        of file without a trailing newline.
+        :type reader: Optional[IO]
+        :param reader: non-blocking read end of a pipe, can be None or closed
+
+        :type buffer: bytearray
+        :param buffer: persistent buffer for incomplete lines
+
+        :rtype: List[bytes]
+        :return: newly completed lines, each including its trailing newline
+        """
+        if reader is None or reader.closed:
+            return []
+        fd = reader.fileno()
+        eof = False
+        while True:
+            try:
+                chunk = os.read(fd, cls.READ_CHUNK_SIZE)
+            except BlockingIOError:
+                # no more data available at the moment
+                break
+            if not chunk:
+                # End of file, writer closed the pipe after process' exit. Close the read end as well, so that
+                # selectors watching the pipe do not keep reporting it as readable forever.
+                eof = True
+                reader.close()
+                break
+            buffer += chunk
+
+        if not buffer:
+            # common case for streams which are expected to stay empty (stderr of the aircrack-ng tools):
+            # a single EAGAIN probe per update, no bytes moved
+            return []
+
+        # Normalize line terminators the way universal newlines mode did for the text streams: the supervised
+        # tools redraw status lines terminated by a bare '\r' (dumpcap's 'Packets:' counter, aireplay-ng's
+        # replay stats), which must end a line for the anchored patterns to match. A trailing '\r' is held
+        # back, it may be the first half of a '\r\n' pair completed by a subsequent read.
+        if not eof and buffer.endswith(b'\r'):
+            held = b'\r'
+            del buffer[-1:]
+        else:
+            held = b''
+        complete = buffer.replace(b'\r\n', b'\n').replace(b'\r', b'\n').split(b'\n')
+        buffer[:] = complete.pop() + held  # bytes of a trailing incomplete line stay buffered
+        lines = [bytes(line) + b'\n' for line in complete]
+        if eof and buffer:
+            # The process ended its output without a final newline (aircrack-ng flushes its whole report only
+            # on exit). No further read can complete the line, return it as the last one without a newline.
+            lines.append(bytes(buffer))
+            buffer.clear()
+        return lines
+
+    def stdout_lines_raw(self) -> List[bytes]:
+        """
+        Read newly completed lines from process' stdout as raw bytes, without blocking.
+        Useful for hot loops which scan lines for ASCII patterns and can therefore skip the UTF-8 decode and `str`
+        allocation for lines of no interest.
+        :rtype: List[bytes]
+        """
+        return self._drain(self.stdout_r, self._stdout_buffer)
+
+    def stderr_lines_raw(self) -> List[bytes]:
+        """
+        Read newly completed lines from process' stderr as raw bytes, without blocking.
+        :rtype: List[bytes]
+        """
+        return self._drain(self.stderr_r, self._stderr_buffer)
+
+    def stdout_lines(self) -> List[str]:
+        """
+        Read newly completed lines from process' stdout, without blocking.
+        :rtype: List[str]
+        """
+        return [line.decode() for line in self.stdout_lines_raw()]
+
+    def stderr_lines(self) -> List[str]:
+        """
+        Read newly completed lines from process' stderr, without blocking.
+        :rtype: List[str]
+        """
+        return [line.decode() for line in self.stderr_lines_raw()]
 
     @abstractmethod
     def update(self):
         """
         Update state of running process from process' feedback.
         Warning:
-            When reading stdout and stderr, use `self.stdout_r` and `self.stderr_r`. Remember to *always* check if these
-            files are open, i.e., `not self.stdout_r.closed` and `not self.stderr_r.closed`.
+            When reading stdout and stderr, use `self.stdout_lines()` and `self.stderr_lines()`. Both can be safely
+            called even after the pipes were closed, in which case they return no lines.
         """
         if self.cleaned:
             raise ValueError("Can't call update on process after cleanup was performed.")
@@ -134,6 +265,8 @@ class UpdatableProcess(ABC, subprocess.Popen):
     def stop(self):
         """
         Stop process if it's running.
+        NOTE: The wait after terminate returns the moment the process exits, so a well-behaved exit costs no
+        fixed sleep; only a process stuck past the timeout is killed and reaped.
         """
         if self.cleaned:
             raise ValueError("Can't call stop on process after cleanup was performed.")
@@ -145,6 +278,7 @@ class UpdatableProcess(ABC, subprocess.Popen):
                 self.wait(timeout=10)
             except subprocess.TimeoutExpired:
                 self.kill()
+                self.wait()  # reap the killed process, SIGKILL cannot be ignored
                 logger.warning('Process {} killed after unsuccessful termination.'.format(type(self).__name__))
             else:
                 logger.debug('Process {} terminated.'.format(type(self).__name__))
@@ -164,7 +298,8 @@ class UpdatableProcess(ABC, subprocess.Popen):
         # If cleanup is called from __del__ after unsuccessful initialization, `self._finalizer` could be uninitialized.
         if self._finalizer_initialized:
             self._finalizer.detach()
-        self._cleanup(files=[self.stdout_w, self.stdout_r, self.stderr_w, self.stderr_r], tmp_dir=self.tmp_dir)
+        self._cleanup(files=[self.stdout_w, self.stdout_r, self.stderr_w, self.stderr_r],
+                      tmp_dir=self.tmp_dir if self._owns_tmp_dir else None)
         self.cleaned = True
 
     @staticmethod
@@ -226,3 +361,62 @@ class UpdatableProcess(ABC, subprocess.Popen):
                     type(self).__name__), ResourceWarning)
         super().__del__()
         self.cleanup(stop=stop_needed)
+
+
+class LineScannerProcess(UpdatableProcess):
+    """
+    UpdatableProcess whose state is driven by scanning individual lines of the captured stdout and stderr.
+
+    The shared `update` implementation polls the process, feeds every newly completed raw line to
+    `self._scan_stdout_line` and `self._scan_stderr_line` and finally performs the transition to the subclass'
+    terminal state. Subclasses declare only the per-line scanning logic; the update plumbing, which used to be
+    copied into every process class, lives here.
+
+    Subclasses are expected to provide a `State` enum with a `TERMINATED` member and keep the current state
+    in `self.state`.
+    """
+    STDERR_SOURCE = None
+    """Command name used in the warning about unexpected stderr lines, see `self._scan_stderr_line`."""
+
+    def update(self):
+        """
+        Update state of running process from process' feedback.
+        Read new output from stdout and stderr, check if process is alive. Set appropriate flags, stats and state.
+        """
+        super().update()
+        # Is process running? State would be changed after reading stdout and stderr.
+        self.poll()
+
+        # check every added line in stdout and stderr, raw lines are scanned without decoding
+        for line in self.stdout_lines_raw():
+            self._scan_stdout_line(line)
+        for line in self.stderr_lines_raw():
+            self._scan_stderr_line(line)
+
+        # Change state if process was not running in the time of poll() call in the beginning of this method.
+        # NOTE: Process' poll() needs to be called in the beginning of this method and returncode checked in the end
+        # to ensure all feedback (stdout and stderr) is read and states are changed accordingly.
+        # If the process exited, its state is not changed immediately. All available feedback is read and then
+        # the state is changed to self.State.TERMINATED. State, flags, stats and others can be changed during reading
+        # the available feedback even if the process exited. But self.State.TERMINATED is assigned here if
+        # the process exited.
+        if self.returncode is not None:
+            self.state = self.State.TERMINATED
+
+    @abstractmethod
+    def _scan_stdout_line(self, line: bytes):
+        """
+        Scan a single raw line of process' stdout and update state, flags and stats accordingly.
+        :type line: bytes
+        :param line: raw line of process' stdout, including its trailing newline
+        """
+        pass
+
+    def _scan_stderr_line(self, line: bytes):
+        """
+        Scan a single raw line of process' stderr.
+        Default implementation warns, stderr of the supervised tools is expected to be empty.
+        :type line: bytes
+        :param line: raw line of process' stderr, including its trailing newline
+        """
+        logger.warning("Unexpected stderr of '%s': '%s'. %s", self.STDERR_SOURCE, line.decode(), self)
